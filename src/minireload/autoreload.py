@@ -19,6 +19,9 @@ Some of the known remaining caveats are:
   can cause problems (but in old objects only).
 - Functions that are removed (eg. via monkey-patching) from a module
   before it is reloaded are not upgraded.
+- Instances without weak reference support (eg. classes using __slots__
+  without __weakref__) created after the first reload of their class
+  may not be upgraded on subsequent reloads.
 - C extension modules cannot be reloaded, and so cannot be autoreloaded.
 """
 
@@ -80,70 +83,146 @@ from importlib import reload
 # ------------------------------------------------------------------------------
 
 
-func_attrs = [
-    "__code__",
-    "__defaults__",
-    "__doc__",
-    "__closure__",
-    "__globals__",
-    "__dict__",
-]
-
-
 def update_function(old, new):
     """Upgrade the code object of a function"""
-    for name in func_attrs:
+    # direct slot assignments instead of a getattr/setattr loop;
+    # __globals__ and __closure__ are read-only on functions and
+    # therefore skipped (assigning them always failed silently before)
+    try:
+        old.__code__ = new.__code__
+        old.__defaults__ = new.__defaults__
+        old.__doc__ = new.__doc__
+        old.__dict__.update(new.__dict__)
+    except (AttributeError, TypeError, ValueError):
+        pass
+
+
+def _track_instances(cls):
+    """Install a weak instance registry on cls, so that update_instances
+    can find live instances without a full gc.get_referrers heap walk.
+    New instances register themselves through a wrapped __new__."""
+
+    if not isinstance(cls.__dict__.get("_mr_instances"), weakref.WeakSet):
         try:
-            setattr(old, name, getattr(new, name))
+            cls._mr_instances = weakref.WeakSet()
         except (AttributeError, TypeError):
+            return
+
+    cls_new = cls.__new__
+    if getattr(cls_new, "_mr_tracking", False):
+        return
+
+    def tracking_new(tracked_cls, *args, **kwargs):
+        if cls_new is object.__new__:
+            inst = cls_new(tracked_cls)
+        else:
+            inst = cls_new(tracked_cls, *args, **kwargs)
+        try:
+            type(inst)._mr_instances.add(inst)
+        except (AttributeError, TypeError):
+            # e.g. instances without weak reference support
             pass
+        return inst
+
+    tracking_new._mr_tracking = True
+    tracking_new._mr_wrapped = cls_new
+    try:
+        cls.__new__ = tracking_new
+    except (AttributeError, TypeError):
+        pass
 
 
 def update_instances(old, new):
-    """Use garbage collector to find all instances that refer to the old
-    class definition and update their __class__ to point to the new class
-    definition"""
+    """Update the __class__ of all instances of the old class definition
+    to point to the new class definition.
 
-    refs = gc.get_referrers(old)
+    Instances are found via the weak registry installed by
+    _track_instances; the garbage collector is only consulted for
+    classes that were created before tracking was in place."""
+
+    registry = old.__dict__.get("_mr_instances")
+    if isinstance(registry, weakref.WeakSet):
+        instances = list(registry)
+    else:
+        instances = [ref for ref in gc.get_referrers(old) if type(ref) is old]
+
+    _track_instances(new)
+    new_registry = new.__dict__.get("_mr_instances")
+
+    for inst in instances:
+        if type(inst) is not old:
+            continue
+        inst.__class__ = new
+        if new_registry is not None:
+            try:
+                new_registry.add(inst)
+            except TypeError:
+                pass
 
-    for ref in refs:
-        if type(ref) is old:
-            ref.__class__ = new
+    # instances created later through stale references to the old class
+    # register themselves as well
+    _track_instances(old)
 
 
 def update_class(old, new):
     """Replace stuff in the __dict__ of a class, and upgrade
     method code objects, and add new methods, if any"""
-    for key in list(old.__dict__.keys()):
+    old_d = old.__dict__
+    new_d = new.__dict__
+
+    if old_d is new_d:
+        return
+
+    for key in old_d.keys() & new_d.keys():
+        # identity check skips unchanged attributes without invoking
+        # potentially expensive __eq__ implementations
+        if old_d[key] is new_d[key]:
+            continue
+
+        # keep the instance tracking machinery installed on old classes
+        if key == "_mr_instances":
+            continue
+
         old_obj = getattr(old, key)
-        try:
-            new_obj = getattr(new, key)
-            # explicitly checking that comparison returns True to handle
-            # cases where `==` doesn't return a boolean.
-            if (old_obj == new_obj) is True:
-                continue
-        except AttributeError:
-            # obsolete attribute: remove it
-            try:
-                delattr(old, key)
-            except (AttributeError, TypeError):
-                pass
+        new_obj = getattr(new, key)
+
+        # never patch a tracking wrapper itself: redirect the update
+        # to the original function it wraps
+        if getattr(old_obj, "_mr_tracking", False):
+            old_obj = old_obj._mr_wrapped
+        if getattr(new_obj, "_mr_tracking", False):
+            new_obj = new_obj._mr_wrapped
+        if old_obj is new_obj:
+            continue
+
+        # explicitly checking that comparison returns True to handle
+        # cases where `==` doesn't return a boolean.
+        if (old_obj == new_obj) is True:
             continue
 
         if update_generic(old_obj, new_obj):
             continue
 
         try:
-            setattr(old, key, getattr(new, key))
+            setattr(old, key, new_obj)
         except (AttributeError, TypeError):
             pass  # skip non-writable attributes
 
-    for key in list(new.__dict__.keys()):
-        if key not in list(old.__dict__.keys()):
-            try:
-                setattr(old, key, getattr(new, key))
-            except (AttributeError, TypeError):
-                pass  # skip non-writable attributes
+    for key in old_d.keys() - new_d.keys():
+        # keep the instance tracking machinery installed on old classes
+        if key == "_mr_instances" or getattr(old_d[key], "_mr_tracking", False):
+            continue
+        # obsolete attribute: remove it
+        try:
+            delattr(old, key)
+        except (AttributeError, TypeError):
+            pass
+
+    for key in new_d.keys() - old_d.keys():
+        try:
+            setattr(old, key, getattr(new, key))
+        except (AttributeError, TypeError):
+            pass  # skip non-writable attributes
 
     # update all instances of class
     update_instances(old, new)
@@ -160,26 +239,32 @@ def isinstance2(a, b, typ):
     return isinstance(a, typ) and isinstance(b, typ)
 
 
-UPDATE_RULES = [
-    (lambda a, b: isinstance2(a, b, type), update_class),
-    (lambda a, b: isinstance2(a, b, types.FunctionType), update_function),
-    (lambda a, b: isinstance2(a, b, property), update_property),
-]
-UPDATE_RULES.extend(
-    [
-        (
-            lambda a, b: isinstance2(a, b, types.MethodType),
-            lambda a, b: update_function(a.__func__, b.__func__),
-        ),
-    ]
-)
+def update_method(a, b):
+    update_function(a.__func__, b.__func__)
+
+
+UPDATE_RULES = {
+    type: update_class,
+    types.FunctionType: update_function,
+    property: update_property,
+    types.MethodType: update_method,
+}
 
 
 def update_generic(a, b):
-    for type_check, update in UPDATE_RULES:
-        if type_check(a, b):
+    # exact-type dispatch covers the common cases with one dict lookup
+    update = UPDATE_RULES.get(type(a))
+    if update is not None and type(a) is type(b):
+        update(a, b)
+        return True
+
+    # subclasses (eg. metaclasses, property subclasses) need the
+    # isinstance check
+    for typ, update in UPDATE_RULES.items():
+        if isinstance2(a, b, typ):
             update(a, b)
             return True
+
     return False
 
 
@@ -215,7 +300,7 @@ def append_obj(module, d, name, obj, autoload=False):
 
     key = (module.__name__, name)
     try:
-        d.setdefault(key, []).append(weakref.ref(obj))
+        d.setdefault(key, weakref.WeakSet()).add(obj)
     except TypeError:
         pass
     return True
@@ -231,15 +316,13 @@ def superreload(module, reload=reload, old_objects=None, shell=None):
     if old_objects is None:
         old_objects = {}
 
-    # collect old objects in the module
-    for name, obj in list(module.__dict__.items()):
-        if not append_obj(module, old_objects, name, obj):
+    # collect old objects in the module; iterating a names snapshot
+    # avoids allocating a full item list of the module namespace
+    for name in tuple(module.__dict__):
+        obj = module.__dict__.get(name)
+        if obj is None:
             continue
-        key = (module.__name__, name)
-        try:
-            old_objects.setdefault(key, []).append(weakref.ref(obj))
-        except TypeError:
-            pass
+        append_obj(module, old_objects, name, obj)
 
     # reload module
     try:
@@ -258,29 +341,27 @@ def superreload(module, reload=reload, old_objects=None, shell=None):
         raise
 
     # iterate over all objects and update functions & classes
-    for name, new_obj in list(module.__dict__.items()):
-        key = (module.__name__, name)
+    module_name = module.__name__
+    for name in tuple(module.__dict__):
+        new_obj = module.__dict__.get(name)
+        if new_obj is None:
+            continue
+        key = (module_name, name)
         if key not in old_objects:
+            if shell is None:
+                continue
             # here 'shell' acts both as a flag and as an output var
-            if (
-                shell is None
-                or name == "Enum"
-                or not append_obj(module, old_objects, name, new_obj, True)
-            ):
+            if name == "Enum" or not append_obj(
+                    module, old_objects, name, new_obj, True):
                 continue
             shell.user_ns[name] = new_obj
 
-        new_refs = []
-        for old_ref in old_objects[key]:
-            old_obj = old_ref()
-            if old_obj is None:
-                continue
-            new_refs.append(old_ref)
+        # the WeakSet automatically drops dead references
+        old_objs = old_objects[key]
+        for old_obj in list(old_objs):
             update_generic(old_obj, new_obj)
 
-        if new_refs:
-            old_objects[key] = new_refs
-        else:
+        if len(old_objs) == 0:
             del old_objects[key]
 
     return module
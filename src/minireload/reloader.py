@@ -2,9 +2,11 @@ import os
 import gc
 import sys
 import time
+import queue
+import hashlib
 import inspect
 import datetime
-import threading
+import functools
 import traceback
 
 from contextlib import contextmanager
@@ -34,16 +36,25 @@ class ReloadEventHandler(FileSystemEventHandler):
 
     def __init__(self):
 
-        self.lock = threading.Lock()
-        self.reload_set = set()
+        # SimpleQueue is lock-free on the fast path and safe to use
+        # from both the watchdog thread and the consumer
+        self.reload_queue = queue.SimpleQueue()
+
+        # timestamp of the most recent event, used for debouncing
+        self.last_event_ts = 0.0
 
     def pop_reload_set(self):
 
-        with self.lock:
-            rl = self.reload_set
-            self.reload_set = set()
+        # the queue may contain a few duplicate paths per event burst,
+        # which collapse while draining into the set
+        reload_set = set()
+        while True:
+            try:
+                reload_set.add(self.reload_queue.get_nowait())
+            except queue.Empty:
+                break
 
-        return rl
+        return reload_set
 
     def on_any_event(self, event):
 
@@ -53,9 +64,9 @@ class ReloadEventHandler(FileSystemEventHandler):
         if event.event_type not in ["modified", "moved", "created"]:
             return
 
-        with self.lock:
-            if event.src_path not in self.reload_set:
-                self.reload_set.add(event.src_path)
+        self.last_event_ts = time.monotonic()
+
+        self.reload_queue.put(event.src_path)
 
 
 class ReloadErrorInfo(Exception):
@@ -63,14 +74,24 @@ class ReloadErrorInfo(Exception):
     def __init__(self, exc):
 
         self.exc = exc
-        self.exc_str = traceback.format_exc()
         self.exc_time = datetime.datetime.now()
         (self.exc_type, self.exc_value, self.exc_tb) = sys.exc_info()
 
-        if isinstance(exc, SyntaxError):
-            self.exc_frames = []
-        else:
-            self.exc_frames = inspect.getinnerframes(self.exc_tb)
+    @functools.cached_property
+    def exc_str(self):
+
+        return "".join(traceback.format_exception(
+            self.exc_type, self.exc_value, self.exc_tb))
+
+    @functools.cached_property
+    def exc_frames(self):
+
+        # reads source context for every frame via linecache, which is
+        # expensive, so this is deferred until actually accessed
+        if isinstance(self.exc, SyntaxError):
+            return []
+
+        return inspect.getinnerframes(self.exc_tb)
 
 
 class Reloader:
@@ -79,19 +100,91 @@ class Reloader:
 
         self.event_handler = ReloadEventHandler()
 
-        self.observers = []
-        for path, recursive in reload_paths:
+        # normalize and deduplicate the reload paths: a path below an
+        # already accepted recursive root would only register redundant
+        # kernel watches
+        roots = []
+        for path, recursive in sorted(reload_paths, key=lambda p: len(p[0])):
             if not os.path.isabs(path):
                 raise ValueError(f'reload path "{path}" must be an absolute path')
-            observer = Observer()
-            observer.schedule(self.event_handler, path, recursive=True)
-            observer.start()
+            path = os.path.normpath(path)
+            if any(root_rec and os.path.commonpath([root, path]) == root
+                   for root, root_rec in roots):
+                continue
+            roots.append((path, recursive))
+
+        # one observer thread suffices for all watched roots
+        self.observer = Observer()
+        for path, recursive in roots:
+            self.observer.schedule(self.event_handler, path, recursive=recursive)
+        self.observer.start()
 
         self.reloaded_modules = []
 
+        # maps module origin paths to module names, rebuilt lazily
+        self._origin_map = {}
+        self._modules_len = 0
+
+        # maps origin paths to (size, mtime, sha1) of the last reloaded version
+        self._file_fingerprints = {}
+
+        # quiet window for coalescing bursts of filesystem events
+        self.debounce_secs = 0.05
+
         # needed for superreload
         self.old_objects = {}
 
+        self._reloads_since_gc = 0
+        self._old_objects_hwm = 0
+
+    def _update_origin_map(self):
+
+        if len(sys.modules) == self._modules_len:
+            return
+
+        for name, m in list(sys.modules.items()):
+            try:
+                origin = m.__spec__.origin
+            except AttributeError:
+                continue
+            if origin is not None:
+                self._origin_map[origin] = name
+
+        self._modules_len = len(sys.modules)
+
+    def _content_changed(self, origin):
+        """
+        Checks whether the file content behind origin actually changed.
+
+        Editors often touch or atomically rewrite files without changing
+        their content, which would trigger spurious (and expensive)
+        superreload runs. Compares a content hash instead of relying on
+        filesystem events alone.
+        """
+
+        try:
+            st = os.stat(origin)
+        except OSError:
+            return False
+
+        # st_mtime_ns avoids float rounding and boxing in the comparison
+        cached = self._file_fingerprints.get(origin)
+        if (cached is not None
+                and cached[0] == st.st_size
+                and cached[1] == st.st_mtime_ns):
+            return False
+
+        try:
+            with open(origin, "rb") as f:
+                digest = hashlib.sha1(f.read()).digest()
+        except OSError:
+            return False
+
+        changed = cached is None or cached[2] != digest
+        self._file_fingerprints[origin] = (st.st_size, st.st_mtime_ns, digest)
+
+        return changed
+
     def reload(self):
         """
         Reloads all modified modules under the specified reload_paths.
@@ -99,32 +192,69 @@ class Reloader:
         Returns True if at least one module was reloaded and False otherwise.
         """
 
-        reload_set = self.event_handler.pop_reload_set()
+        # checking for pending events is cheap and avoids draining
+        # the queue on every call
+        if self.event_handler.reload_queue.empty():
+            return False
 
-        if len(reload_set) == 0:
+        # editors produce several events per save (write, rename, ...);
+        # waiting for a quiet window coalesces each burst into a single
+        # reload and avoids reloading half-written files
+        if time.monotonic() - self.event_handler.last_event_ts < self.debounce_secs:
             return False
 
+        reload_set = self.event_handler.pop_reload_set()
+
+        self._update_origin_map()
+
         self.reloaded_modules = []
 
-        for name, m in sys.modules.items():
-            try:
-                origin = m.__spec__.origin
-            except AttributeError:
+        # defer the reload because it may modify sys.modules
+        for origin in reload_set & self._origin_map.keys():
+            if not self._content_changed(origin):
                 continue
-
-            # defer the reload because it may modify sys.modules
-            if origin in reload_set:
+            m = sys.modules.get(self._origin_map[origin])
+            if m is not None:
                 self.reloaded_modules.append(m)
 
+        if len(self.reloaded_modules) == 0:
+            return False
+
         for m in self.reloaded_modules:
             superreload(m, old_objects=self.old_objects)
 
-        # important: do a garbage collection run after every reload
-        # clears out old objects and reduces subsequent reload runtimes
-        gc.collect()
+        self._collect_garbage()
 
         return True
 
+    def _collect_garbage(self):
+        """
+        Adaptive garbage collection after reloads.
+
+        Collecting clears out old objects and reduces subsequent reload
+        runtimes, but a full generational sweep after every reload is
+        expensive on large heaps. Runs a cheap gen-1 collection on most
+        reloads and a full one only every few reloads or when the pool
+        of old objects grew noticeably.
+        """
+
+        self._reloads_since_gc += 1
+
+        # drop entries whose WeakSets no longer hold any live objects
+        for key in [k for k, v in self.old_objects.items() if len(v) == 0]:
+            del self.old_objects[key]
+
+        total_refs = sum(len(v) for v in self.old_objects.values())
+
+        if self._reloads_since_gc >= 16:
+            gc.collect()
+            self._reloads_since_gc = 0
+            self._old_objects_hwm = total_refs
+        elif (self._reloads_since_gc >= 4
+                or total_refs > 2 * self._old_objects_hwm):
+            gc.collect(1)
+            self._old_objects_hwm = max(self._old_objects_hwm, total_refs)
+
 
 class WrappingReloader(Reloader):
     """
@@ -139,7 +269,8 @@ class WrappingReloader(Reloader):
     def __init__(self,
                  func,
                  reload_paths: list[tuple[str, bool]] = None,
-                 retry_after_secs=0.1):
+                 retry_after_secs=0.1,
+                 check_interval_secs=0.05):
 
         if reload_paths is None:
             reload_paths = [(get_toplevel_module_path(func), True)]
@@ -148,28 +279,61 @@ class WrappingReloader(Reloader):
 
         self.func = func
         self.retry_after_secs = retry_after_secs
+        self.check_interval_secs = check_interval_secs
+
+        self._next_check = 0.0
 
         self.exc_info = None
 
+        # dispatch is specialized on the current state, so the healthy
+        # path pays no per-call branching on error handling state
+        self._dispatch = self._call_healthy
+
     def __call__(self, *args, **kwargs):
 
+        return self._dispatch(*args, **kwargs)
+
+    def _handle_exc(self, exc):
+
+        traceback.print_exc()
+        self.exc_info = ReloadErrorInfo(exc)
+        self._dispatch = self._call_in_error
+
+        return self.exc_info
+
+    def _call_healthy(self, *args, **kwargs):
+
+        try:
+            # limits how often the wrapped function pays for reload checks
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.check_interval_secs
+                self.reload()
+
+            return self.func(*args, **kwargs)
+        except KeyboardInterrupt as e:
+            raise e
+        except SystemExit as e:
+            raise e
+        except Exception as e:
+            return self._handle_exc(e)
+
+    def _call_in_error(self, *args, **kwargs):
+
         try:
             if self.reload():
                 self.exc_info = None
+                self._dispatch = self._call_healthy
+                return self._call_healthy(*args, **kwargs)
 
-            if self.exc_info is None:
-                return self.func(*args, **kwargs)
-            else:
-                time.sleep(self.retry_after_secs)
-                return self.exc_info
+            time.sleep(self.retry_after_secs)
+            return self.exc_info
         except KeyboardInterrupt as e:
             raise e
         except SystemExit as e:
             raise e
         except Exception as e:
-            traceback.print_exc()
-            self.exc_info = ReloadErrorInfo(e)
-            return self.exc_info
+            return self._handle_exc(e)
 
 
 def launch(cls, func_name, exc_func_name=""):